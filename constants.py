@@ -134,7 +134,9 @@ class Constants:
     or any other inquire, please visit our GitHub repository at
     github.com/alejandrogzi/postoga."""
     HIST_NBINS = 50
+    LOG_BUFFER_CAPACITY = 256
     PHYLO_DEFAULT = "mammals"
+    THREADS_DEFAULT = 3  # conversion, ancestral genes and pseudo-BUSCO steps
     BUSCO_DBS_BASE = {"eukaryota": "eukaryota_odb10", "vertebrata": "vertebrata_odb10"}
     BUSCO_DBS_MAMMALS = {
         "mammalia": "mammalia_odb10",
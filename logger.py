@@ -36,10 +36,21 @@ to better manage the logging of the tool.
 
 
 import os
+import atexit
 import datetime
+import queue
+import threading
+from typing import ClassVar, Dict, Optional
 from constants import Constants
 from modules.utils import shell
-import logging
+
+try:
+    # C-implemented drop-in replacement for the stdlib logging module
+    import picologging as logging
+    from picologging.handlers import MemoryHandler, QueueHandler, QueueListener
+except ImportError:
+    import logging
+    from logging.handlers import MemoryHandler, QueueHandler, QueueListener
 
 
 __author__ = "Alejandro Gonzales-Irribarren"
@@ -51,20 +62,59 @@ __version__ = "0.9.0-devel"
 class Log:
     """Logger class for postoga."""
 
+    # background thread draining log records to disk, shared by all Log instances
+    _listener: ClassVar[Optional["QueueListener"]] = None
+    # records waiting for the listener, joined by flush()
+    _queue: ClassVar[Optional[queue.Queue]] = None
+    # in-memory buffer in front of the log file, written out by flush()
+    _buffer: ClassVar[Optional["MemoryHandler"]] = None
+    # Log instances handed out by connect(), keyed by log file path
+    _connected: ClassVar[Dict[str, "Log"]] = {}
+    # per-thread list of held back messages while collect() runs
+    _local: ClassVar[threading.local] = threading.local()
+
     def __init__(self, path: str, log_file: str):
         self.log_file = os.path.join(path, log_file)
         self.version = __version__
+        self.logger = logging.getLogger()
         # self.commit = shell(Constants.Commands.COMMIT)
         # self.branch = shell(Constants.Commands.BRANCH)
 
     def start(self):
-        logging.basicConfig(
-            filename=self.log_file,
-            level=logging.INFO,
-            format="[%(asctime)s] - %(levelname)s: %(message)s",
-            datefmt="%Y-%m-%d %H:%M:%S",
+        # Same semantics as logging.basicConfig: only the first call configures the root logger
+        root = self.logger
+        if root.handlers:
+            return
+
+        file_handler = logging.FileHandler(self.log_file)
+        file_handler.setFormatter(
+            logging.Formatter(
+                "[%(asctime)s] - %(levelname)s: %(message)s",
+                datefmt="%Y-%m-%d %H:%M:%S",
+            )
         )
 
+        # Batch writes to disk, flushing right away only on errors
+        buffered_handler = MemoryHandler(
+            Constants.LOG_BUFFER_CAPACITY,
+            flushLevel=logging.ERROR,
+            target=file_handler,
+        )
+
+        # The main thread only enqueues records, the listener writes them to disk
+        records = queue.Queue(-1)
+        root.addHandler(QueueHandler(records))
+        root.setLevel(logging.INFO)
+
+        Log._queue = records
+        Log._buffer = buffered_handler
+        Log._listener = QueueListener(records, buffered_handler)
+        Log._listener.start()
+
+        # atexit runs in reverse order: drain the queue first, then flush the buffer
+        atexit.register(buffered_handler.flush)
+        atexit.register(Log._listener.stop)
+
     def intro(self):
         start_message = f"{'#'*36}\npostoga: the post-TOGA processing pipeline"
         version = f"version: {self.version}"
@@ -79,19 +129,61 @@ class Log:
         print(start_message + "\n" + metadata)
 
     def record(self, message, timestamp=True):
-        logging.info(message)
+        pending = getattr(Log._local, "pending", None)
+        if pending is not None:
+            pending.append(message)
+            return
+
+        self.logger.info(message)
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         print(f"[{timestamp}] - INFO: {message}")
 
+    def collect(self, func, *args):
+        """
+        Runs func(*args) holding back everything it records, so steps run
+        on worker threads do not interleave their messages
+
+        @type func: callable
+        @param func: step to run
+        @rtype: tuple
+        @return: the step result and its messages, to be passed to replay()
+        """
+        pending = Log._local.pending = []
+        try:
+            return func(*args), pending
+        except BaseException:
+            Log._local.pending = None
+            self.replay(pending)
+            raise
+        finally:
+            Log._local.pending = None
+
+    def replay(self, messages):
+        for message in messages:
+            self.record(message)
+
     @classmethod
     def connect(cls, path, log_file):
-        log = cls(path, log_file)
-        log.start()
+        # Modules connect on every call, reuse the Log already set up for this file
+        key = os.path.join(path, log_file)
+        log = cls._connected.get(key)
+        if log is None:
+            log = cls(path, log_file)
+            log.start()
+            cls._connected[key] = log
         return log
 
+    def flush(self):
+        # The listener marks every record done, so join() waits until the queue is drained
+        if Log._queue is None:
+            return
+        Log._queue.join()
+        Log._buffer.flush()
+
     def close(self):
         end_message = f"postoga finished!\n{'#'*36}"
-        logging.info(end_message)
+        self.logger.info(end_message)
+        self.flush()
 
 
 if __name__ == "__main__":
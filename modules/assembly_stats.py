@@ -15,7 +15,7 @@ import os
 import pandas as pd
 from constants import Constants
 from logger import Log
-from modules.utils import bed_reader, ancestral_reader
+from modules.utils import bed_names, ancestral_reader
 from typing import Union
 
 
@@ -37,8 +37,7 @@ def get_classes(outdir: Union[str, os.PathLike], bed: str, table: pd.DataFrame)
     log = Log.connect(outdir, Constants.FileNames.LOG)
 
     # Creates a table with unique genes in the query annotation (base or filtered) and sort them based on their class
-    bed = bed_reader(bed)
-    genes = table[table["transcripts"].isin(bed[3])].sort_values(
+    genes = table[table["transcripts"].isin(bed_names(bed))].sort_values(
         by=["t_gene", "class"], key=lambda x: x.map(Constants.ORDER)
     )
 
@@ -4,11 +4,12 @@
 """ A module to filter the original .bed file based on the query table."""
 
 
+import numpy as np
 import pandas as pd
 import os
 from constants import Constants
 from logger import Log
-from modules.utils import bed_reader
+from modules.utils import bed_names
 from typing import Union
 
 
@@ -41,51 +42,62 @@ def filter_bed(
     log = Log.connect(outdir, Constants.FileNames.LOG)
     initial = len(table)
 
-    if threshold:
-        table = table[table["pred"] >= float(threshold)]
+    # Build a single mask from the filters that are actually set
+    keep = np.ones(initial, dtype=bool)
+
+    if threshold is not None:
+        passed = (table["pred"] >= float(threshold)).to_numpy()
         log.record(
-            f"discarded {initial - len(table)} projections with orthology scores <{threshold}"
+            f"discarded {np.count_nonzero(keep & ~passed)} projections with orthology scores <{threshold}"
         )
+        keep &= passed
 
     if by_class:
-        edge = len(table)
-        table = table[table["class"].isin(by_class.split(","))]
+        passed = table["class"].isin(by_class.split(",")).to_numpy()
         log.record(
-            f"discarded {edge - len(table)} projections with classes other than {by_class}"
+            f"discarded {np.count_nonzero(keep & ~passed)} projections with classes other than {by_class}"
         )
+        keep &= passed
 
     if by_rel:
-        edge = len(table)
-        table = table[table["relation"].isin(by_rel.split(","))]
+        passed = table["relation"].isin(by_rel.split(",")).to_numpy()
         log.record(
-            f"discarded {edge - len(table)} projections with relationships other than {by_rel}"
+            f"discarded {np.count_nonzero(keep & ~passed)} projections with relationships other than {by_rel}"
         )
-    if paralog:
+        keep &= passed
+
+    if not keep.all():
+        table = table[keep]
+
+    if paralog is not None:
         edge = len(table)
-        table = table.groupby('helper').filter(lambda x: (x['pred'] > float(paralog)).sum() <= 1)
+        # Number of chains above the paralog threshold per transcript, broadcast to each row
+        chains = (table["pred"] > float(paralog)).groupby(table["helper"]).transform("sum")
+        table = table[chains <= 1]
         log.record(
             f"discarded {edge - len(table)} transcripts with more than 1 chain with orthology probs >{paralog}"
         )
 
-    # Read the original .bed file and filter it based on the transcripts table
-    bed = pd.read_csv(
-        os.path.join(togadir, Constants.FileNames.BED), sep="\t", header=None
-    )
-    bed = bed[bed[3].isin(table["transcripts"])]
-    custom_table = table[table["transcripts"].isin(bed[3])]
-
-    # Write the filtered .bed file
+    # Stream the original .bed file and copy the lines of kept transcripts verbatim
+    kept_transcripts = set(table["transcripts"])
+    names = []
     f = os.path.join(outdir, Constants.FileNames.FILTERED_BED)
-    bed.to_csv(
-        f,
-        sep="\t",
-        header=None,
-        index=False,
-    )
+    with open(os.path.join(togadir, Constants.FileNames.BED), "r") as src, open(
+        f, "w"
+    ) as dst:
+        for line in src:
+            if not line.strip():
+                continue
+            name = line.rstrip("\r\n").split("\t", 4)[3]
+            if name in kept_transcripts:
+                names.append(name)
+                dst.write(line)
+
+    custom_table = table[table["transcripts"].isin(names)]
 
     info = [
-        f"kept {len(bed)} projections after filters, discarded {initial - len(bed)}.",
-        f"{len(bed)} projections are coming from {len(custom_table['helper'].unique())} unique transcripts and {len(custom_table['t_gene'].unique())} genes",
+        f"kept {len(names)} projections after filters, discarded {initial - len(names)}.",
+        f"{len(names)} projections are coming from {len(custom_table['helper'].unique())} unique transcripts and {len(custom_table['t_gene'].unique())} genes",
         f"class stats of new bed: {custom_table['class'].value_counts().to_dict()}",
         f"relation stats of new bed: {custom_table['relation'].value_counts().to_dict()}",
         # f"confidence stats of new bed: {custom_table['confidence_level'].value_counts().to_dict()}",
@@ -105,8 +117,7 @@ def filter_bed(
 
 def get_stats_from_bed(bed: str, table: pd.DataFrame):
     """Get the stats of a given bed file"""
-    bed = bed_reader(bed)
-    bed_table = table[table["transcripts"].isin(bed[3])]
+    bed_table = table[table["transcripts"].isin(bed_names(bed))]
     stats = [
         bed_table["class"].value_counts().to_dict(),
         bed_table["relation"].value_counts().to_dict(),
@@ -6,7 +6,7 @@
 import os
 import pandas as pd
 import numpy as np
-from modules.utils import bed_reader
+from modules.utils import bed_names
 from modules.make_query_table import query_table
 from constants import Constants
 from functools import reduce
@@ -35,8 +35,8 @@ def get_haplotype_classes(paths: list, source: str) -> None:
         # For each path, build a query table and filter it based on the bed file, then append to dfs
         for path in paths:
             table = query_table(path)
-            bed = bed_reader(os.path.join(path, Constants.FileNames.BED))
-            df = table[table["transcripts"].isin(bed[3])]
+            bed = bed_names(os.path.join(path, Constants.FileNames.BED))
+            df = table[table["transcripts"].isin(bed)]
             dfs.append(df)
     else:
         # For each path, read loss_summ_data.tsv and append to dfs
@@ -72,6 +72,25 @@ def get_haplotype_rules(rule: list) -> dict:
     return rules
 
 
+def rank_classes(classes: pd.DataFrame, rules: dict) -> np.ndarray:
+    """
+    @type classes: pd.DataFrame
+    @param classes: a DataFrame with one class column per haplotype
+    @type rules: dict
+    @param rules: a dictionary of the form {rule:order}
+    @rtype: np.ndarray
+    @return: the rule order of every class, same shape as classes
+    """
+
+    ranks = classes.apply(lambda col: col.map(rules))
+
+    if ranks.isna().any().any():
+        unknown = set(classes.to_numpy()[ranks.isna().to_numpy()])
+        raise ValueError(f"Classes {unknown} are not included in the merging rule")
+
+    return ranks.to_numpy()
+
+
 def merge_haplotypes(paths: list, source: str, rule: list) -> pd.DataFrame:
     """
     @type paths: str
@@ -123,12 +142,13 @@ def merge_haplotypes(paths: list, source: str, rule: list) -> pd.DataFrame:
         multiple_table["consensus"] = None
         multiple_table.fillna("NF", inplace=True)
 
-        for index, row in multiple_table.iterrows():
-            classes = [row[f"class_{i}"] for i in range(len(dfs))]
-
-            # Calculate the consensus class based on the provided rules
-            consensus_class = min(classes, key=lambda c: rules[c])
-            multiple_table.at[index, "consensus"] = consensus_class
+        # Calculate the consensus class based on the provided rules: the first
+        # haplotype class with the lowest rank wins
+        classes = multiple_table[[f"class_{i}" for i in range(len(dfs))]]
+        ranks = rank_classes(classes, rules)
+        multiple_table["consensus"] = classes.to_numpy()[
+            np.arange(len(classes)), ranks.argmin(axis=1)
+        ]
 
         if source != "loss":
             for i in range(len(dfs)):
@@ -203,16 +223,17 @@ def merge_haplotypes(paths: list, source: str, rule: list) -> pd.DataFrame:
         paired_table["class_x"].fillna("NF", inplace=True)
         paired_table["class_y"].fillna("NF", inplace=True)
 
-        for index, row in paired_table.iterrows():
-            x = row["class_x"]
-            y = row["class_y"]
+        # Keep the class when both haplotypes agree, otherwise the class with the lowest rank
+        x = paired_table["class_x"].to_numpy()
+        y = paired_table["class_y"].to_numpy()
+        consensus = x.copy()
+        differ = x != y
+
+        if differ.any():
+            ranks = rank_classes(paired_table.loc[differ, ["class_x", "class_y"]], rules)
+            consensus[differ] = np.where(ranks[:, 0] < ranks[:, 1], x[differ], y[differ])
 
-            if x == y:
-                paired_table.at[index, "consensus"] = x
-            elif rules[x] < rules[y]:
-                paired_table.at[index, "consensus"] = x
-            else:
-                paired_table.at[index, "consensus"] = y
+        paired_table["consensus"] = consensus
 
         if source != "loss":
             paired_table["t_gene_x"].fillna(paired_table["t_gene_y"], inplace=True)
@@ -7,6 +7,7 @@ import os
 import pandas as pd
 from constants import Constants
 from logger import Log
+from typing import Optional
 
 
 __author__ = "Alejandro Gonzales-Irribarren"
@@ -25,6 +26,10 @@ def query_table(path: str) -> pd.DataFrame:
 
     log = Log.connect(path, Constants.FileNames.LOG)
 
+    # Snapshot the results directory once instead of probing each file
+    with os.scandir(path) as entries:
+        present = {entry.name for entry in entries}
+
     # Reads orthology_classification, loss_sum_data, and ortholog_scores.
     orthology = pd.read_csv(os.path.join(path, Constants.FileNames.ORTHOLOGY), sep="\t")
     loss = pd.read_csv(
@@ -34,13 +39,20 @@ def query_table(path: str) -> pd.DataFrame:
         names=["projection", "transcript", "class"],
     )
 
-    score = safe_read_csv(path, Constants.FileNames.SCORES, sep="\t")
+    score = safe_read_csv(
+        path,
+        Constants.FileNames.SCORES,
+        present,
+        sep="\t",
+        usecols=["gene", "chain", "pred"],
+    )
     isoforms = safe_read_csv(
-        path, Constants.FileNames.ISOFORMS, sep="\t", header=None
+        path, Constants.FileNames.ISOFORMS, present, sep="\t", header=None
     )
     paralogs = safe_read_csv(
-        path, 
+        path,
         Constants.FileNames.PARALOGS,
+        present,
         sep="\t",
         header=None,
         names=["transcripts"],
@@ -53,6 +65,10 @@ def query_table(path: str) -> pd.DataFrame:
     loss = loss[loss["projection"] == "PROJECTION"]
     loss["helper"] = loss["transcript"].str.rsplit(".", n=1).str[0]
 
+    # Keep only the columns retained downstream before joining
+    orthology = orthology[["q_transcript", "t_gene", "orthology_class", "q_gene"]]
+    loss = loss[["transcript", "class", "helper"]]
+
     ortho_x_loss = pd.merge(
         orthology, loss, left_on="q_transcript", right_on="transcript", how="outer"
     )
@@ -131,8 +147,23 @@ def get_median(group):
     return group.loc[:, "pred"].median()
 
 
-def safe_read_csv(path: str, filename: str, **kwargs) -> pd.DataFrame:
+def safe_read_csv(path: str, filename: str, present: Optional[set] = None, **kwargs) -> pd.DataFrame:
+    """
+    Reads a TOGA file from the results directory or its temp/ subdirectory
+
+    @type path: str
+    @param path: path to the results directory
+    @type filename: str
+    @param filename: name of the file to read
+    @type present: set
+    @param present: file names found in the results directory (optional)
+    """
+    if present is not None:
+        if filename not in present:
+            path = os.path.join(path, Constants.TEMP)
+        return pd.read_csv(os.path.join(path, filename), **kwargs)
+
     try:
         return pd.read_csv(os.path.join(path, filename), **kwargs)
     except FileNotFoundError:
-        return pd.read_csv(os.path.join(path, "temp", filename), **kwargs)
+        return pd.read_csv(os.path.join(path, Constants.TEMP, filename), **kwargs)
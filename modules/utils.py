@@ -3,7 +3,9 @@
 """ A module with postoga base utility functions. """
 
 
+import os
 import subprocess
+from functools import lru_cache
 import pandas as pd
 
 __author__ = "Alejandro Gonzales-Irribarren"
@@ -33,6 +35,28 @@ def bed_reader(bed: str) -> pd.DataFrame:
     return pd.read_csv(bed, sep="\t", header=None)
 
 
+def bed_names(bed: str) -> pd.Index:
+    """
+    Returns the transcript names (4th column) of a .bed file
+
+    The names are read once per file and shared by every step that
+    only needs to know which projections are in the annotation.
+
+    @type bed: str
+    @param bed: path to .bed file
+    """
+    stat = os.stat(bed)
+    return _read_bed_names(bed, stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=4)
+def _read_bed_names(bed: str, mtime: int, size: int) -> pd.Index:
+    # mtime and size are part of the cache key so a rewritten file is read again;
+    # the cache is bounded so stale versions of a file do not stay in memory
+    names = pd.read_csv(bed, sep="\t", header=None, usecols=[3])[3]
+    return pd.Index(names)
+
+
 def ancestral_reader(ancestral: str, source: str) -> list:
     """
     Reads an ancestral file and returns a pandas DataFrame
@@ -34,9 +34,13 @@ def isoform_writer(outdir: Union[str, os.PathLike], table: pd.DataFrame) -> str:
     f = os.path.join(outdir, Constants.FileNames.OWNED_ISOFORMS)
 
     # Get only gene:transcript pairs
-    table = table.iloc[:, [0, 2]]
-    table.dropna(inplace=True)
-    table.to_csv(f, sep="\t", header=None, index=False)
+    table = table.iloc[:, [0, 2]].dropna()
+    genes = table.iloc[:, 0].to_numpy()
+    transcripts = table.iloc[:, 1].to_numpy()
+
+    # Plain two-column format, no need for the pandas CSV writer
+    with open(f, "w", buffering=1 << 20) as out:
+        out.writelines(f"{gene}\t{tx}\n" for gene, tx in zip(genes, transcripts))
 
     log.record(f"gene-to-projection hash with {len(table)} entries written to {f}")
 
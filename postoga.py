@@ -13,17 +13,13 @@ files for downstream analysis.
 
 import os
 import argparse
+import concurrent.futures
+import functools
+import json
 import sys
+from typing import Optional
 from constants import Constants
 from logger import Log
-from modules.convert_from_bed import bed_to_gtf, bed_to_gff
-from modules.make_query_table import query_table
-from modules.write_isoforms import isoform_writer
-from modules.filter_query_annotation import filter_bed, get_stats_from_bed
-from modules.assembly_stats import qual_by_ancestral, busco_completeness
-from modules.haplotype_branch import merge_haplotypes
-from modules.plotter import postoga_plotter
-from modules.ortholog_lengths import calculate_lengths
 
 __author__ = "Alejandro Gonzales-Irribarren"
 __email__ = "jose.gonzalesdezavala1@unmsm.edu.pe"
@@ -31,6 +27,22 @@ __github__ = "https://github.com/alejandrogzi"
 __version__ = "0.9.0-devel"
 
 
+# Base mode arguments stored on TogaDir under the same name
+BASE_FIELDS = (
+    "togadir",
+    "to",
+    "by_class",
+    "by_rel",
+    "threshold",
+    "species",
+    "source",
+    "phylo",
+    "skip",
+    "isoforms",
+    "threads",
+)
+
+
 class TogaDir:
     """A class to represent a TOGA results directory."""
 
@@ -49,23 +61,15 @@ class TogaDir:
         if args.mode != "haplotype":
             """The default branch of postoga"""
             ##### STEP 1 #####
-            self.togadir = args.togadir
-            self.to = args.to
+            for field in BASE_FIELDS:
+                setattr(self, field, getattr(args, field))
             self.q_assembly = args.assembly_qual
+            self.para_threshold = args.paralog
             self.log = Log(self.outdir, Constants.FileNames.LOG)
-            self.by_class = args.by_class if args.by_class else None
-            self.by_rel = args.by_rel if args.by_rel else None
-            self.threshold = args.threshold if args.threshold else None
-            self.para_threshold = args.paralog if args.paralog else None
-            self.species = args.species
-            self.source = args.source
-            self.phylo = args.phylo
-            self.skip = args.skip
-            self.isoforms = args.isoforms
         else:
             """The haplotype branch of postoga"""
-            self.togadirs = args.haplotype_path.split(",")
-            self.rule = args.rule.split(">")
+            self.togadirs = args.haplotype_dir
+            self.rule = args.rule
             self.source = args.source
             self.log = Log(self.outdir, Constants.FileNames.LOG)
 
@@ -77,57 +81,96 @@ class TogaDir:
         @param args: defined arguments
         """
 
-        os.mkdir(self.outdir) if not os.path.isdir(self.outdir) else None
+        if self.mode == "haplotype":
+            # Fail before creating any output if the haplotype inputs are unusable
+            missing = [path for path in self.togadirs if not os.path.isdir(path)]
+            if missing:
+                sys.exit(f"Error: TOGA results directories not found: {', '.join(missing)}")
+            if len(self.togadirs) < 2:
+                sys.exit("Error: you must provide at least two paths to merge haplotypes")
+
+        os.makedirs(self.outdir, exist_ok=True)
         self.log.start()
         self.log.intro()
         self.log.record(f"postoga started!")
         self.log.record(
-            f"running in mode {self.mode} with arguments: {vars(self.args)}"
+            f"running in mode {self.mode} with arguments: {json.dumps(vars(self.args), default=str, separators=(',', ':'))}"
         )
 
+        # Modules are imported per branch, pandas/matplotlib are only loaded when needed
         if self.mode != "haplotype":
+            from modules.make_query_table import query_table
+            from modules.write_isoforms import isoform_writer
+            from modules.filter_query_annotation import filter_bed, get_stats_from_bed
+            from modules.assembly_stats import qual_by_ancestral, busco_completeness
+            from modules.ortholog_lengths import calculate_lengths
+
             self.table = query_table(self.togadir)
             if not self.isoforms:
                 self.isoforms = isoform_writer(self.outdir, self.table)
             else:
                 self.log.record(f"using custom isoform table provided by the user: {self.isoforms}")
 
-            if any([self.by_class, self.by_rel, self.threshold, self.para_threshold]):
+            base_bed = os.path.join(self.togadir, Constants.FileNames.BED)
+
+            if (
+                self.by_class
+                or self.by_rel
+                or self.threshold is not None
+                or self.para_threshold is not None
+            ):
                 self.bed, self.stats, self.ngenes, self.custom_table = filter_bed(
                     self.togadir, self.outdir, self.table, self.by_class, self.by_rel, self.threshold, self.para_threshold
                 )
-                self.base_stats, _ = get_stats_from_bed(
-                    os.path.join(self.togadir, Constants.FileNames.BED), self.table
-                )
+                self.base_stats, _ = get_stats_from_bed(base_bed, self.table)
             else:
-                self.bed = os.path.join(self.togadir, Constants.FileNames.BED)
+                self.bed = base_bed
                 self.base_stats, self.ngenes = get_stats_from_bed(self.bed, self.table)
                 self.stats = None
                 self.custom_table = self.table
 
-            if self.to == "gtf":
-                self.gmodel = bed_to_gtf(self.outdir, self.bed, self.isoforms)
-            elif self.to == "gff":
-                self.gmodel = bed_to_gff(self.outdir, self.bed, self.isoforms)
-            elif self.to == "bed":
-                self.gmodel = self.bed
+            self.log.flush()
 
-            if self.skip:
-                self.log.record("skipping steps 2, 3, and 4 and only filtering the .bed file")
-            else:
-                ##### STEP 2 #####
-                self.ancestral_stats = qual_by_ancestral(
-                    self.outdir, self.bed, self.custom_table, self.q_assembly, self.source
-                )
+            # Conversion and steps 2 and 4 only read the bed file and the query table.
+            # Their messages are held back and recorded in the sequential step order.
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.threads) as executor:
+                if self.to == "gtf":
+                    from modules.convert_from_bed import bed_to_gtf
 
-                ##### STEP 3 #####
-                self.ortholog_lengths = calculate_lengths(self.outdir, self.gmodel)
+                    gmodel = executor.submit(self.log.collect, bed_to_gtf, self.outdir, self.bed, self.isoforms)
+                elif self.to == "gff":
+                    from modules.convert_from_bed import bed_to_gff
 
-                ##### STEP 4 #####
+                    gmodel = executor.submit(self.log.collect, bed_to_gff, self.outdir, self.bed, self.isoforms)
+                else:
+                    gmodel = None
 
-                self.completeness_stats = busco_completeness(
-                    self.outdir, self.custom_table, self.source, self.phylo
-                )
+                if not self.skip:
+                    ##### STEP 2 #####
+                    ancestral_stats = executor.submit(
+                        self.log.collect, qual_by_ancestral, self.outdir, self.bed, self.custom_table, self.q_assembly, self.source
+                    )
+
+                    ##### STEP 4 #####
+                    completeness_stats = executor.submit(
+                        self.log.collect, busco_completeness, self.outdir, self.custom_table, self.source, self.phylo
+                    )
+
+                self.gmodel = self._collect_result(gmodel) if gmodel else self.bed
+
+                if self.skip:
+                    self.log.record("skipping steps 2, 3, and 4 and only filtering the .bed file")
+                else:
+                    ##### STEP 3 #####
+                    ortholog_lengths = self.log.collect(calculate_lengths, self.outdir, self.gmodel)
+                    self.ancestral_stats = self._collect_result(ancestral_stats)
+                    self.ortholog_lengths = self._collect_result(ortholog_lengths)
+                    self.completeness_stats = self._collect_result(completeness_stats)
+
+            self.log.flush()
+
+            if not self.skip:
+                from modules.plotter import postoga_plotter
 
                 postoga_plotter(
                     self.outdir,
@@ -145,10 +188,26 @@ class TogaDir:
             self.log.close()
 
         else:
+            from modules.haplotype_branch import merge_haplotypes
+
             hap_classes = merge_haplotypes(self.togadirs, self.source, self.rule)
             self.log.close()
 
 
+    def _collect_result(self, collected) -> object:
+        """
+        Records the messages held back by Log.collect and returns the step result
+
+        @type collected: concurrent.futures.Future | tuple
+        @param collected: future or (result, messages) pair from Log.collect
+        """
+        if isinstance(collected, concurrent.futures.Future):
+            collected = collected.result()
+        result, messages = collected
+        self.log.replay(messages)
+        return result
+
+
 def base_branch(subparsers, parent_parser):
     base_parser = subparsers.add_parser("base", help="Base mode", parents = [parent_parser])
     base_parser.add_argument(
@@ -161,14 +220,14 @@ def base_branch(subparsers, parent_parser):
         "--by-class",
         help="Filter parameter to only include certain orthology classes (I, PI, UL, M, PM, L, UL)",
         required=False,
-        type=str,
+        type=_nonempty_str,
     )
     base_parser.add_argument(
         "-br",
         "--by-rel",
         help="Filter parameter to only include certain orthology relationships (o2o, o2m, m2m, m2m, o2z)",
         required=False,
-        type=str,
+        type=_nonempty_str,
     )
     base_parser.add_argument(
         "-th",
@@ -242,6 +301,46 @@ def base_branch(subparsers, parent_parser):
         default=None,
         type=str,
     )
+    base_parser.add_argument(
+        "-t",
+        "--threads",
+        help="Number of threads used to run independent steps concurrently (default: 3)",
+        required=False,
+        default=Constants.THREADS_DEFAULT,
+        type=_positive_int,
+    )
+
+
+def _nonempty_str(value: str) -> Optional[str]:
+    """Treats an empty filter value (e.g. --by-class "") as not set"""
+    return value or None
+
+
+def _positive_int(value: str) -> int:
+    """Parses a strictly positive integer (e.g. --threads)"""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: '{value}'") from None
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {number}")
+    return number
+
+
+def _split_paths(value: str) -> list:
+    """Parses comma-separated TOGA directories (path1,path2,path3)"""
+    paths = value.split(",")
+    if not all(paths):
+        raise argparse.ArgumentTypeError(f"empty path in '{value}'")
+    return paths
+
+
+def _split_rule(value: str) -> list:
+    """Parses a haplotype merging rule (I>PI>UL>...)"""
+    rule = value.split(">")
+    if not all(rule):
+        raise argparse.ArgumentTypeError(f"empty class in rule '{value}'")
+    return rule
 
 
 def haplotype_branch(subparsers, parent_parser):
@@ -251,14 +350,14 @@ def haplotype_branch(subparsers, parent_parser):
         "--haplotype_dir",
         help="Path to TOGA results directories separated by commas (path1,path2,path3)",
         required=True,
-        type=str,
+        type=_split_paths,
     )
     haplotype_parser.add_argument(
         "-r",
         "--rule",
         help="Rule to merge haplotype assemblies (default: I>PI>UL>L>M>PM>PG>abs)",
         required=False,
-        type=str,
+        type=_split_rule,
         default="I>PI>UL>L>M>PM>PG>NF",
     )
     haplotype_parser.add_argument(
@@ -272,8 +371,9 @@ def haplotype_branch(subparsers, parent_parser):
     )
 
 
-def parser():
-    """Argument parser for postoga"""
+@functools.lru_cache(maxsize=None)
+def _build_parser() -> argparse.ArgumentParser:
+    """Builds the postoga argument parser once and reuses it"""
     app = argparse.ArgumentParser()
     parent_parser = argparse.ArgumentParser(add_help=False)
  
@@ -290,6 +390,13 @@ def parser():
     base_branch(subparsers, parent_parser)
     haplotype_branch(subparsers, parent_parser)
 
+    return app
+
+
+def parser():
+    """Argument parser for postoga"""
+    app = _build_parser()
+
     if len(sys.argv) < 2:
         app.print_help()
         sys.exit(0)
@@ -3,7 +3,14 @@
 """Version handler for postoga."""
 
 
+import concurrent.futures
+import functools
+import mmap
 import os
+import re
+import shutil
+import subprocess
+import tempfile
 
 
 __author__ = "Alejandro Gonzales-Irribarren"
@@ -11,6 +18,71 @@ __email__ = "jose.gonzalesdezavala1@unmsm.edu.pe"
 __github__ = "https://github.com/alejandrogzi"
 __credits__ = ["Bogdan M. Kirilenko"]
 
+# Whole lines carrying a version marker, matched over the full file contents
+README_PATTERN = re.compile(
+    rb"^[^\n]*(img\.shields\.io/badge/version-|## What's new)[^\n]*\n?", re.M
+)
+SCRIPT_PATTERN = re.compile(rb"^[^\n]*__version__ =[^\n]*\n?", re.M)
+# Bare markers, used to tell whether a file needs rewriting at all
+README_MARKERS = re.compile(rb"img\.shields\.io/badge/version-|## What's new")
+SCRIPT_MARKERS = re.compile(rb"__version__ =")
+
+
+def _rewrite(path, pattern, repl):
+    """Substitutes pattern over the whole (non-empty) file and swaps the result in atomically"""
+    # Substitute straight over the mapped file, no intermediate read buffer
+    with open(path, "rb") as src, mmap.mmap(
+        src.fileno(), 0, access=mmap.ACCESS_READ
+    ) as contents:
+        data = pattern.sub(repl, contents)
+
+        # Leave files that already carry the right version untouched (no write, no mtime bump)
+        with memoryview(contents) as view:
+            if view == data:
+                return
+
+    tmp = tempfile.NamedTemporaryFile(
+        "wb", dir=os.path.dirname(path) or ".", delete=False
+    )
+    try:
+        with tmp:
+            tmp.write(data)
+        shutil.copymode(path, tmp.name)
+        os.replace(tmp.name, path)
+    except BaseException:
+        # Never leave a half-written temporary file next to the original
+        os.unlink(tmp.name)
+        raise
+
+
+def _has_marker(path, markers):
+    """Checks whether the markers pattern matches anywhere in path without decoding it"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            return markers.search(m) is not None
+
+
+@functools.lru_cache(maxsize=1)
+def _dirty_files():
+    """Returns the files with uncommitted changes, from a single git call
+
+    'git ls-files -m' only compares the index stat data against the working
+    tree, it does not compute diff hunks like 'git diff' does. Returns None
+    when git fails (e.g. outside a repository), every file then counts as dirty.
+    """
+    result = subprocess.run(
+        ["git", "ls-files", "-m", "-z"], check=False, stdout=subprocess.PIPE
+    )
+    if result.returncode != 0:
+        return None
+    return frozenset(
+        os.path.normpath(os.fsdecode(path))
+        for path in result.stdout.split(b"\0")
+        if path
+    )
+
 
 class Version:
     def __init__(self, major, minor, patch, dev=False):
@@ -18,50 +90,102 @@ class Version:
         self.minor = minor
         self.patch = patch
         self.dev = dev
-        self.color = "blue"
-        self.version_repr = f"{major}.{minor}.{patch}"
-        self.readme_repr = self.version_repr
-        if self.dev:
-            self.version_repr += f"-devel"
-            self.readme_repr += f"--devel"
-            self.color = "orange"
+        self._py_scripts = None
+        # Encoded replacement lines, filled on first use and reused for every file
+        self._badge_line = None
+        self._news_line = None
+        self._version_line = None
+
+    # Representations are only built on first use, importing __version__ stays cheap.
+    # Plain properties since cached_property needs Python 3.8
+    @property
+    def version_repr(self):
+        suffix = "-devel" if self.dev else ""
+        return f"{self.major}.{self.minor}.{self.patch}{suffix}"
+
+    @property
+    def readme_repr(self):
+        # shields.io badges need the dash escaped as "--"
+        suffix = "--devel" if self.dev else ""
+        return f"{self.major}.{self.minor}.{self.patch}{suffix}"
+
+    @property
+    def color(self):
+        return "orange" if self.dev else "blue"
+
+    @property
+    def badge_line(self):
+        if self._badge_line is None:
+            self._badge_line = f"![version](https://img.shields.io/badge/version-{self.readme_repr}-{self.color})\n".encode()
+        return self._badge_line
+
+    @property
+    def news_line(self):
+        if self._news_line is None:
+            self._news_line = f"## What's new on version {self.version_repr}\n\n".encode()
+        return self._news_line
+
+    @property
+    def version_line(self):
+        if self._version_line is None:
+            self._version_line = f'__version__ = "{self.version_repr}"\n'.encode()
+        return self._version_line
 
     def update_readme(self, filename="README.md"):
-        with open(filename, "r") as f:
-            lines = f.readlines()
-
-        with open(filename, "w") as f:
-            for line in lines:
-                if "img.shields.io/badge/version-" in line:
-                    line = f"![version](https://img.shields.io/badge/version-{self.readme_repr}-{self.color})\n"
-                elif "## What's new" in line:
-                    line = f"## What's new on version {self.version_repr}\n\n"
-                f.write(line)
-
-    def get_py_scripts(self):
-        scripts = []
-        for root, dirs, files in os.walk("."):
-            for file in files:
-                if file.endswith(".py"):
-                    if file != "version.py":
-                        scripts.append(os.path.join(root, file))
-        return scripts
+        def repl(match):
+            return self.badge_line if match.group(1).startswith(b"img") else self.news_line
+
+        if _has_marker(filename, README_MARKERS):
+            _rewrite(filename, README_PATTERN, repl)
+
+    @property
+    def py_scripts(self):
+        # Filled on first access; plain attribute since cached_property needs Python 3.8
+        if self._py_scripts is not None:
+            return self._py_scripts
+
+        # Skip this very module by (device, inode) rather than by name
+        own = os.stat(__file__)
+
+        def is_self(entry):
+            # inode() is free on most platforms, only stat for the device on a match
+            if entry.inode() != own.st_ino:
+                return False
+            return entry.stat(follow_symlinks=False).st_dev == own.st_dev
+
+        def walk(directory):
+            # DirEntry caches the file type from the directory read, no extra stat per entry
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        yield from walk(entry.path)
+                    elif entry.name.endswith(".py") and not is_self(entry):
+                        yield entry.path
+
+        self._py_scripts = list(walk("."))
+        return self._py_scripts
+
+    def _invalidate_scripts_cache(self):
+        # Forces the next py_scripts access to walk the tree again
+        self._py_scripts = None
 
     def check_uncomitted(self, file):
-        cmd = f"git diff --exit-code {file}"
-        return os.system(cmd) != 0
+        dirty = _dirty_files()
+        return dirty is None or os.path.normpath(file) in dirty
 
     def update_scripts(self):
-        scripts = self.get_py_scripts()
-        for script in scripts:
-            if self.check_uncomitted(script) or script == "logger.py":
-                with open(script, "r") as f:
-                    lines = f.readlines()
-                with open(script, "w") as f:
-                    for line in lines:
-                        if "__version__ =" in line:
-                            line = f'__version__ = "{self.version_repr}"\n'
-                        f.write(line)
+        # Resolve the git status once so workers only do file I/O
+        _dirty_files()
+
+        def update_script(script):
+            if self.check_uncomitted(script) or os.path.normpath(script) == "logger.py":
+                # Most scripts carry no version line, skip rewriting those
+                if _has_marker(script, SCRIPT_MARKERS):
+                    _rewrite(script, SCRIPT_PATTERN, lambda _: self.version_line)
+
+        workers = min(32, (os.cpu_count() or 1) * 4)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(update_script, self.py_scripts))
 
     def __repr__(self):
         return self.version_repr